@@ -0,0 +1,33 @@
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import BaseFilterBackend
+
+
+class ProductNameSearchFilter(BaseFilterBackend):
+    """
+    Prefix search over product names for autocomplete.
+
+    On SQLite the lookup goes through the api_product_fts full-text index,
+    other databases fall back to a case-insensitive substring match.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '')
+        words = re.findall(r'\w+', term)
+        if not term.strip():
+            return queryset
+        if not words:
+            return queryset.none()
+
+        if connection.vendor != 'sqlite':
+            for word in words:
+                queryset = queryset.filter(name__icontains=word)
+            return queryset
+
+        match = ' '.join(f'"{word}"*' for word in words)
+        return queryset.filter(id__in=RawSQL(
+            'SELECT rowid FROM api_product_fts WHERE api_product_fts MATCH %s', [match]
+        ))
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+FORWARD_SQL = [
+    "CREATE VIRTUAL TABLE api_product_fts USING fts5("
+    "name, content='api_product', content_rowid='id', prefix='2 3')",
+    "CREATE TRIGGER api_product_fts_ai AFTER INSERT ON api_product BEGIN "
+    "INSERT INTO api_product_fts(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER api_product_fts_ad AFTER DELETE ON api_product BEGIN "
+    "INSERT INTO api_product_fts(api_product_fts, rowid, name) VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER api_product_fts_au AFTER UPDATE ON api_product BEGIN "
+    "INSERT INTO api_product_fts(api_product_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+    "INSERT INTO api_product_fts(rowid, name) VALUES (new.id, new.name); END",
+    "INSERT INTO api_product_fts(api_product_fts) VALUES ('rebuild')",
+]
+
+REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS api_product_fts_au",
+    "DROP TRIGGER IF EXISTS api_product_fts_ad",
+    "DROP TRIGGER IF EXISTS api_product_fts_ai",
+    "DROP TABLE IF EXISTS api_product_fts",
+]
+
+
+def run_on_sqlite(statements):
+    """FTS5 is SQLite only, other databases search products without an index"""
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(FORWARD_SQL), run_on_sqlite(REVERSE_SQL)),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.0 on 2026-10-19 10:56
+
+from importlib import import_module
+
+from django.db import migrations, models
+from django.db.models import Count
+
+product_fts = import_module('api.migrations.0002_product_fts')
+
+# Adding a column makes SQLite rebuild api_product, which drops its triggers.
+# They are recreated afterwards, reindexing only when the name changes.
+TRIGGER_SQL = [
+    "DROP TRIGGER IF EXISTS api_product_fts_au",
+    "DROP TRIGGER IF EXISTS api_product_fts_ad",
+    "DROP TRIGGER IF EXISTS api_product_fts_ai",
+    "CREATE TRIGGER api_product_fts_ai AFTER INSERT ON api_product BEGIN "
+    "INSERT INTO api_product_fts(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER api_product_fts_ad AFTER DELETE ON api_product BEGIN "
+    "INSERT INTO api_product_fts(api_product_fts, rowid, name) VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER api_product_fts_au AFTER UPDATE OF name ON api_product BEGIN "
+    "INSERT INTO api_product_fts(api_product_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+    "INSERT INTO api_product_fts(rowid, name) VALUES (new.id, new.name); END",
+    "INSERT INTO api_product_fts(api_product_fts) VALUES ('rebuild')",
+]
+
+recreate_triggers = product_fts.run_on_sqlite(TRIGGER_SQL)
+
+
+def count_usage(apps, schema_editor):
+    Product = apps.get_model('api', 'Product')
+    OrderDetail = apps.get_model('api', 'OrderDetail')
+    usage = OrderDetail.objects.filter(product__isnull=False) \
+        .values('product').annotate(total=Count('id'))
+    for row in usage:
+        Product.objects.filter(pk=row['product']).update(usage_count=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_product_fts'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recreate_triggers),
+        migrations.AddField(
+            model_name='product',
+            name='usage_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_usage, migrations.RunPython.noop),
+        migrations.RunPython(recreate_triggers, migrations.RunPython.noop),
+    ]
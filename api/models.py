@@ -1,4 +1,26 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+
+
+class OrderRevision(models.Model):
+    """
+    Single row counter, bumped inside every transaction that changes listed orders.
+    Its row lock is a known serialization point: on a server database concurrent
+    order writes queue on it until commit. SQLite already serializes all writes.
+    """
+    value = models.BigIntegerField(default=0)
+
+    @classmethod
+    def next(cls):
+        """
+        Must run inside the writing transaction. The row lock taken by the increment is
+        held until commit, so revisions grow in commit order, unlike auto_now timestamps
+        that are taken before the write waits for the database lock.
+        """
+        if not cls.objects.filter(pk=1).update(value=F('value') + 1):
+            cls.objects.get_or_create(pk=1)
+            return cls.next()
+        return cls.objects.values_list('value', flat=True).get(pk=1)
 
 
 class Order(models.Model):
@@ -15,8 +37,21 @@ class Order(models.Model):
 
     status = models.CharField(max_length=12, choices=order_status, default='new', blank=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    revision = models.BigIntegerField(default=0, editable=False)
     external_id = models.CharField(max_length=128)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'revision']),
+        ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            self.revision = OrderRevision.next()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'revision'}
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f'Order № {self.external_id}'
 
@@ -24,6 +59,14 @@ class Order(models.Model):
 class Product(models.Model):
     """class for creating Product model"""
     name = models.CharField(max_length=64)
+    usage_count = models.PositiveIntegerField(default=0, editable=False)
+
+    def save(self, *args, **kwargs):
+        """usage_count is kept by the OrderDetail signals, a stale copy must not overwrite it"""
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name != 'usage_count']
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
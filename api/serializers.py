@@ -3,7 +3,15 @@ from rest_framework import serializers
 from .models import Order, OrderDetail, Product
 
 
+class ProductNameSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Product
+        fields = ['id', 'name']
+
+
 class OrderDetailSerializer(serializers.ModelSerializer):
+    product = ProductNameSerializer(read_only=True)
+
     class Meta:
         model = OrderDetail
         fields = ['id', 'amount', 'price', 'product']
@@ -11,11 +19,23 @@ class OrderDetailSerializer(serializers.ModelSerializer):
 
 
 class ProductSerializer(serializers.ModelSerializer):
-    product = OrderDetailSerializer(many=True)
+    """
+    Product with its usage count and only the latest `usage_limit` order details.
+    Uses `recent_details` when the view has already fetched them.
+    """
+    usage_limit = 5
+
+    product = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
-        fields = ['id', 'name', 'product']
+        fields = ['id', 'name', 'usage_count', 'product']
+
+    def get_product(self, obj):
+        details = getattr(obj, 'recent_details', None)
+        if details is None:
+            details = obj.product.select_related('product').order_by('-id')[:self.usage_limit]
+        return OrderDetailSerializer(details, many=True).data
 
 
 class OrderListSerializer(serializers.ModelSerializer):
@@ -0,0 +1,116 @@
+import threading
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Order, OrderDetail, OrderRevision, Product
+
+_pending = threading.local()
+
+
+def touch_orders(order_ids):
+    """Mark orders as changed for the list ETag"""
+    with transaction.atomic():
+        Order.objects.filter(pk__in=order_ids).update(revision=OrderRevision.next())
+
+
+class TouchBatch:
+    """
+    Orders to touch once the current transaction commits, so a transaction
+    touches all its orders in one update however many details it wrote.
+    Touching after commit is safe: the ETag changes only after the new data is visible.
+    """
+
+    def __init__(self):
+        self.order_ids = set()
+        self.deleted_order_ids = set()
+        self.flushed = False
+
+    def flush(self):
+        self.flushed = True
+        order_ids = self.order_ids - self.deleted_order_ids
+        if order_ids:
+            touch_orders(order_ids)
+
+
+def current_batch():
+    """
+    The batch of the running transaction. A batch is live while its flush is queued,
+    a commit runs it and a rollback discards it together with the collected ids.
+    """
+    connection = transaction.get_connection()
+    batch = getattr(_pending, 'batch', None)
+    if batch is None or batch.flushed or \
+            not any(entry[1] == batch.flush for entry in connection.run_on_commit):
+        batch = _pending.batch = TouchBatch()
+        transaction.on_commit(batch.flush)
+    return batch
+
+
+def touch_orders_on_commit(order_ids):
+    order_ids = set(order_ids) - {None}
+    if not order_ids:
+        return
+    if not transaction.get_connection().in_atomic_block:
+        touch_orders(order_ids)
+        return
+    current_batch().order_ids.update(order_ids)
+
+
+def count_usage(product_id, delta):
+    if product_id is not None:
+        Product.objects.filter(pk=product_id).update(usage_count=F('usage_count') + delta)
+
+
+@receiver(pre_save, sender=OrderDetail)
+def remember_detail_links(sender, instance, **kwargs):
+    """Keep the order and product a detail pointed to before this save"""
+    instance._previous_links = (None, None)
+    if instance.pk is not None:
+        instance._previous_links = OrderDetail.objects.filter(pk=instance.pk) \
+            .values_list('order_id', 'product_id').first() or (None, None)
+
+
+@receiver(post_save, sender=OrderDetail)
+def count_saved_detail(sender, instance, created, **kwargs):
+    """Move one usage from the previous product to the current one"""
+    previous = None if created else instance._previous_links[1]
+    if previous != instance.product_id:
+        count_usage(previous, -1)
+        count_usage(instance.product_id, 1)
+
+
+@receiver(post_delete, sender=OrderDetail)
+def count_deleted_detail(sender, instance, **kwargs):
+    count_usage(instance.product_id, -1)
+
+
+@receiver(pre_delete, sender=Order)
+def remember_deleted_order(sender, instance, **kwargs):
+    """Details deleted with their order do not need to touch it"""
+    if transaction.get_connection().in_atomic_block:
+        current_batch().deleted_order_ids.add(instance.pk)
+
+
+@receiver(post_save, sender=OrderDetail)
+def touch_detail_order(sender, instance, **kwargs):
+    """Changing a detail changes its order, and the order it moved from, as listed by the API"""
+    touch_orders_on_commit([instance.order_id, instance._previous_links[0]])
+
+
+@receiver(post_delete, sender=OrderDetail)
+def touch_deleted_detail_order(sender, instance, **kwargs):
+    """Deleting a detail removes it from its order, unless the order goes too"""
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block or instance.order_id not in current_batch().deleted_order_ids:
+        touch_orders_on_commit([instance.order_id])
+
+
+@receiver(post_save, sender=Product)
+def touch_product_orders(sender, instance, created, **kwargs):
+    """Renaming a product changes every order that embeds it"""
+    if not created:
+        touch_orders_on_commit(Order.objects.filter(details__product=instance)
+                               .values_list('id', flat=True))
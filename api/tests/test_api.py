@@ -1,11 +1,12 @@
 import json
 
+from django.core.cache import cache
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from api.serializers import OrderListSerializer
-from ..models import Order, OrderDetail, Product
+from api.serializers import OrderListSerializer, ProductSerializer
+from ..models import Order, OrderDetail, OrderRevision, Product
 
 
 class OrderApiTestCase(APITestCase):
@@ -77,3 +78,254 @@ class OrderApiTestCase(APITestCase):
         url = reverse('Order-detail', args=[self.details_test.id])
         response = self.client.delete(url)
         self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
+
+
+class OrderBatchApiTestCase(APITestCase):
+
+    def setUp(self):
+        self.orders = []
+        for index in range(3):
+            order = Order.objects.create(external_id=f'PR-{index}')
+            product = Product.objects.create(name=f'product_{index}')
+            OrderDetail.objects.create(order=order, amount=index, price=1.00, product=product)
+            self.orders.append(order)
+
+    def test_batch_by_ids(self):
+        """Test for getting orders by ids in the requested order"""
+        ids = [self.orders[2].id, 999, self.orders[0].id]
+        url = reverse('Order-batch')
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'ids': ','.join(map(str, ids))})
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        expected_data = [
+            OrderListSerializer(self.orders[2]).data,
+            {'id': 999, 'error': 'not found'},
+            OrderListSerializer(self.orders[0]).data,
+        ]
+        self.assertEqual(expected_data, response.json())
+
+    def test_batch_by_external_ids(self):
+        """Test for getting orders by external ids"""
+        url = reverse('Order-batch')
+        response = self.client.get(url, {'external_ids': 'PR-1,PR-404'})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(self.orders[1].id, response.json()[0]['id'])
+        self.assertEqual({'external_id': 'PR-404', 'error': 'not found'}, response.json()[1])
+
+    def test_batch_errors(self):
+        """Test for rejecting invalid batch requests"""
+        url = reverse('Order-batch')
+        too_many = ','.join(str(pk) for pk in range(101))
+        for params in ({}, {'ids': 'a,b'}, {'ids': ''}, {'ids': too_many},
+                       {'ids': '99999999999999999999'}, {'ids': '1_0'}):
+            response = self.client.get(url, params)
+            self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code, params)
+
+
+class ProductApiTestCase(APITestCase):
+
+    def setUp(self):
+        self.dropbox = Product.objects.create(name='Dropbox Business')
+        self.drive = Product.objects.create(name='Google Drive')
+        order = Order.objects.create(external_id='PR-1')
+        for index in range(ProductSerializer.usage_limit + 3):
+            OrderDetail.objects.create(order=order, amount=index, price=1.00, product=self.dropbox)
+
+    def test_get_list(self):
+        """Test for getting paginated list of products with capped usage"""
+        url = reverse('Product-list')
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('items 1-2/2', response['Content-Range'])
+        dropbox = response.json()[0]
+        self.assertEqual(ProductSerializer.usage_limit + 3, dropbox['usage_count'])
+        self.assertEqual(ProductSerializer.usage_limit, len(dropbox['product']))
+
+    def test_retrieve(self):
+        """Test for getting a product with its latest details only"""
+        url = reverse('Product-detail', args=[self.dropbox.id])
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        latest = OrderDetail.objects.filter(product=self.dropbox).order_by('-id')
+        expected_ids = [detail.id for detail in latest[:ProductSerializer.usage_limit]]
+        self.assertEqual(expected_ids, [detail['id'] for detail in response.json()['product']])
+
+    def test_usage_count_follows_details(self):
+        """Test for keeping stored usage counts in sync with order details"""
+        data = {'external_id': 'PR-2', 'details': [{'amount': 1, 'price': '1.00', 'product': {'name': 'new'}}]}
+        response = self.client.post(reverse('Order-list'), data=data, format='json')
+        product = Product.objects.get(pk=response.json()['details'][0]['product']['id'])
+        self.assertEqual(1, product.usage_count)
+
+        detail = OrderDetail.objects.get(product=product)
+        detail.product = self.drive
+        detail.save()
+        product.refresh_from_db()
+        self.drive.refresh_from_db()
+        self.assertEqual((0, 1), (product.usage_count, self.drive.usage_count))
+
+        detail.delete()
+        self.drive.refresh_from_db()
+        self.assertEqual(0, self.drive.usage_count)
+
+    def test_read_only(self):
+        """Test for rejecting writes to the product catalog"""
+        response = self.client.post(reverse('Product-list'), data={'name': 'x'}, format='json')
+        self.assertEqual(status.HTTP_405_METHOD_NOT_ALLOWED, response.status_code)
+        response = self.client.delete(reverse('Product-detail', args=[self.dropbox.id]))
+        self.assertEqual(status.HTTP_405_METHOD_NOT_ALLOWED, response.status_code)
+        self.assertTrue(OrderDetail.objects.filter(product=self.dropbox).exists())
+
+    def test_search(self):
+        """Test for searching products by name prefix"""
+        url = reverse('Product-list')
+        response = self.client.get(url, {'search': 'dr'})
+        self.assertEqual([self.dropbox.id, self.drive.id], [item['id'] for item in response.json()])
+
+        response = self.client.get(url, {'search': 'drop bus'})
+        self.assertEqual([self.dropbox.id], [item['id'] for item in response.json()])
+
+    def test_search_follows_updates(self):
+        """Test for keeping the search index in sync with product names"""
+        self.drive.name = 'OneDrive'
+        self.drive.save()
+        url = reverse('Product-list')
+        response = self.client.get(url, {'search': 'onedr'})
+        self.assertEqual([self.drive.id], [item['id'] for item in response.json()])
+        response = self.client.get(url, {'search': 'google'})
+        self.assertEqual([], response.json())
+
+
+class OrderListCachingApiTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name='test_product')
+        self.orders = []
+        with self.captureOnCommitCallbacks(execute=True):
+            for index in range(2):
+                order = Order.objects.create(external_id=f'PR-{index}')
+                OrderDetail.objects.create(order=order, amount=1, price=1.00, product=self.product)
+                self.orders.append(order)
+        for order in self.orders:
+            order.refresh_from_db()
+        self.url = reverse('Order-list')
+
+    def test_not_modified(self):
+        """Test for answering 304 when the listed orders did not change"""
+        response = self.client.get(self.url, {'status': 'new'})
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'status': 'new'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+        self.assertEqual(etag, response['ETag'])
+
+    def test_etag_depends_on_filters(self):
+        """Test for different etags of different filter sets"""
+        new = self.client.get(self.url, {'status': 'new'})
+        failed = self.client.get(self.url, {'status': 'failed'})
+        self.assertNotEqual(new['ETag'], failed['ETag'])
+
+    def test_cached_page(self):
+        """Test for serving an unchanged page from the cache"""
+        first = self.client.get(self.url)
+        with self.assertNumQueries(1):
+            second = self.client.get(self.url)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(first['Content-Range'], second['Content-Range'])
+
+    def test_write_invalidates(self):
+        """Test for changing the etag and page after an update"""
+        etag = self.client.get(self.url)['ETag']
+        detail_url = reverse('Order-detail', args=[self.orders[0].id])
+        self.client.put(detail_url, data={'external_id': 'PR-new'}, format='json')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+        self.assertIn('PR-new', [order['external_id'] for order in response.json()])
+
+    def test_product_rename_invalidates(self):
+        """Test for changing the etag when an embedded product is renamed"""
+        etag = self.client.get(self.url)['ETag']
+        self.product.name = 'renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('renamed', response.json()[0]['details'][0]['product']['name'])
+
+    def test_detail_delete_invalidates(self):
+        """Test for changing the etag and page when a detail is deleted"""
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderDetail.objects.filter(order=self.orders[0]).delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        orders = {order['id']: order for order in response.json()}
+        self.assertEqual([], orders[self.orders[0].id]['details'])
+
+    def test_detail_move_invalidates(self):
+        """Test for changing the etag of the order a detail moved away from"""
+        other = Order.objects.create(external_id='PR-other', status=Order.FAILED)
+        etag = self.client.get(self.url, {'status': 'new'})['ETag']
+        detail = OrderDetail.objects.get(order=self.orders[0])
+        detail.order = other
+        with self.captureOnCommitCallbacks(execute=True):
+            detail.save()
+        response = self.client.get(self.url, {'status': 'new'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        orders = {order['id']: order for order in response.json()}
+        self.assertEqual([], orders[self.orders[0].id]['details'])
+
+    def test_revision_grows_with_writes(self):
+        """Test for taking a new revision on every save and touch of an order"""
+        first, second = self.orders
+        first.save()
+        self.assertLess(second.revision, first.revision)
+        self.product.name = 'renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        second.refresh_from_db()
+        self.assertLess(first.revision, second.revision)
+
+    def test_touch_once_per_transaction(self):
+        """Test for touching an order once however many of its details change"""
+        order = self.orders[0]
+        with self.captureOnCommitCallbacks() as callbacks:
+            for index in range(3):
+                OrderDetail.objects.create(order=order, amount=index, price=1.00, product=self.product)
+        self.assertEqual(1, len(callbacks))
+        with self.assertNumQueries(5):
+            callbacks[0]()
+        revision = order.revision
+        order.refresh_from_db()
+        self.assertLess(revision, order.revision)
+
+    def test_order_delete_skips_touch(self):
+        """Test for not touching an order while it is deleted with its details"""
+        url = reverse('Order-detail', args=[self.orders[0].id])
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(5):
+                response = self.client.delete(url)
+        self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
+        revisions = OrderRevision.objects.values_list('value', flat=True)
+        self.assertEqual(self.orders[1].revision, revisions.get())
+
+    def test_create_keeps_counts_and_etag(self):
+        """Test for updating product usage and the list etag on order create"""
+        etag = self.client.get(self.url, {'limit': 10})['ETag']
+        data = {'external_id': 'PR-2', 'details': [{'amount': 1, 'price': '1.00', 'product': {'name': 'new'}}]}
+        with self.captureOnCommitCallbacks(execute=True):
+            created = self.client.post(self.url, data=data, format='json').json()
+        product = Product.objects.get(pk=created['details'][0]['product']['id'])
+        self.assertEqual(1, product.usage_count)
+
+        response = self.client.get(self.url, {'limit': 10}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertIn(created, response.json())
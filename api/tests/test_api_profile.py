@@ -0,0 +1,101 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ..models import Order
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+PROFILE_REQUESTS = """
+import json
+from flow.wsgi import application
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment
+
+call_command('check')
+setup_test_environment()
+connection.creation.create_test_db(verbosity=0)
+
+from api.models import Order
+
+order = Order.objects.create(external_id='test_order')
+client = Client()
+detail_url = '/api/v1/orders/%d' % order.pk
+listing = client.get('/api/v1/orders')
+print(json.dumps({
+    'apps': settings.INSTALLED_APPS,
+    'conn_max_age': settings.DATABASES['default']['CONN_MAX_AGE'],
+    'list': [listing.status_code, listing['Content-Type'], listing.has_header('X-Frame-Options')],
+    'html': client.get('/api/v1/orders', HTTP_ACCEPT='text/html').status_code,
+    'form': client.put(detail_url, data={'external_id': 'PR-1'}).status_code,
+    'json': client.put(detail_url, data={'external_id': 'PR-1'},
+                       content_type='application/json').status_code,
+    'admin': client.get('/admin/').status_code,
+}))
+"""
+
+
+@override_settings(ROOT_URLCONF='flow.urls_api')
+class ApiProfileUrlsTestCase(APITestCase):
+
+    def setUp(self):
+        self.order = Order.objects.create(external_id='test_order')
+
+    def test_get_list(self):
+        """Test for getting list of orders through the API-only urls"""
+        response = self.client.get(reverse('Order-list'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_admin_is_not_routed(self):
+        """Test for missing admin site"""
+        response = self.client.get('/admin/')
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+
+class ApiProfileTestCase(SimpleTestCase):
+    """Runs requests in a fresh interpreter with flow.settings_api loaded"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'flow.settings_api'}
+        output = subprocess.run(
+            [sys.executable, '-c', PROFILE_REQUESTS],
+            cwd=BASE_DIR, env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        cls.result = json.loads(output.strip().splitlines()[-1])
+
+    def test_apps(self):
+        """Test for dropping admin, sessions and messages"""
+        self.assertEqual(['rest_framework', 'django_filters', 'api'], self.result['apps'])
+
+    def test_persistent_connections(self):
+        """Test for keeping database connections open"""
+        self.assertEqual(600, self.result['conn_max_age'])
+
+    def test_get_list(self):
+        """Test for json list without clickjacking middleware"""
+        self.assertEqual([status.HTTP_200_OK, 'application/json', False], self.result['list'])
+
+    def test_browsable_api_is_not_served(self):
+        """Test for rejecting a request for html"""
+        self.assertEqual(status.HTTP_406_NOT_ACCEPTABLE, self.result['html'])
+
+    def test_form_data_is_rejected(self):
+        """Test for accepting json payloads only"""
+        self.assertEqual(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, self.result['form'])
+        self.assertEqual(status.HTTP_200_OK, self.result['json'])
+
+    def test_admin_is_not_routed(self):
+        """Test for missing admin site"""
+        self.assertEqual(status.HTTP_404_NOT_FOUND, self.result['admin'])
@@ -28,6 +28,17 @@ class ProductSerializerTestCase(TestCase):
         expected_data = {
             'id': product.id,
             'name': 'prod',
+            'usage_count': 0,
             'product': []
         }
         self.assertEqual(expected_data, data)
+
+    def test_product_serializer_limits_details(self):
+        product = Product.objects.create(name='prod')
+        details = [OrderDetail.objects.create(amount=index, price=1.00, product=product)
+                   for index in range(ProductSerializer.usage_limit + 2)]
+        product.refresh_from_db()
+        data = ProductSerializer(product).data
+        self.assertEqual(len(details), data['usage_count'])
+        self.assertEqual([detail.id for detail in reversed(details[2:])],
+                         [detail['id'] for detail in data['product']])
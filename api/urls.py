@@ -1,7 +1,8 @@
-from .views import OrderViewSet
+from .views import OrderViewSet, ProductViewSet
 from rest_framework.routers import DefaultRouter
 
 router = DefaultRouter(trailing_slash=False)
 router.register('orders', OrderViewSet, basename='Order')
+router.register('products', ProductViewSet, basename='Product')
 
 urlpatterns = router.urls
@@ -1,30 +1,104 @@
+import hashlib
+import re
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Prefetch, Subquery
+from django.utils.http import parse_etags
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.filters import OrderingFilter
 from rest_framework.response import Response
 
+from .filters import ProductNameSearchFilter
 from .pagination import ContentRangeHeaderPagination
 from .serializers import OrderDetailSerializer, ProductSerializer, \
     OrderListSerializer, OrderRetrieveSerializer
 from api.models import Order, OrderDetail, Product
-from rest_framework.viewsets import ModelViewSet
+from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
 
-class ProductViewSet(ModelViewSet):
+class ProductViewSet(ReadOnlyModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    pagination_class = ContentRangeHeaderPagination
+
+    filter_backends = [ProductNameSearchFilter, OrderingFilter]
+    ordering_fields = ['id', 'name']
+    ordering = ['id']
+
+    def get_queryset(self):
+        """
+        url: /api/v1/products?search=drop
+
+        Pages over products only, usage counts are stored on the product.
+        The latest `usage_limit` order details of the products on the page are
+        prefetched in one query, picked by a correlated subquery with a LIMIT.
+        It is built from ORM expressions without derived tables and runs on SQLite
+        and PostgreSQL. MySQL does not support LIMIT in IN subqueries.
+        """
+        latest_ids = OrderDetail.objects.filter(product=OuterRef('product')) \
+            .order_by('-id').values('id')[:ProductSerializer.usage_limit]
+        recent_details = OrderDetail.objects.filter(id__in=Subquery(latest_ids)).order_by('-id')
+        return Product.objects.prefetch_related(
+            Prefetch('product', queryset=recent_details, to_attr='recent_details')
+        )
 
 
 class OrderViewSet(ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderListSerializer
     pagination_class = ContentRangeHeaderPagination
+    batch_max_size = 100
+    list_cache_timeout = 300
 
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ['external_id', 'status']
     ordering_fields = ['id', 'status', 'created_at']
 
+    def list(self, request, *args, **kwargs):
+        """
+        url: /api/v1/orders?status=new
+
+        The response carries a weak ETag built from the query parameters and the
+        latest revision and row count of the filtered orders. A request with a matching
+        If-None-Match gets 304, otherwise the page is served from the cache
+        until a write to the filtered orders changes the ETag.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        etag = self.get_list_etag(request, queryset)
+        if self._etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        cache_key = f'orders-list:{etag}'
+        cached = cache.get(cache_key)
+        if cached is None:
+            page = self.paginate_queryset(queryset.prefetch_related('details__product'))
+            serializer = self.get_serializer(page, many=True)
+            response = self.get_paginated_response(serializer.data)
+            headers = {key: value for key, value in response.items() if key != 'Content-Type'}
+            cached = (list(response.data), headers)
+            cache.set(cache_key, cached, self.list_cache_timeout)
+
+        data, headers = cached
+        return Response(data, headers={**headers, 'ETag': etag})
+
+    @staticmethod
+    def get_list_etag(request, queryset):
+        marker = queryset.order_by().aggregate(revision=Max('revision'), total=Count('id'))
+        params = sorted(request.query_params.lists())
+        key = f'{params}|{marker["revision"]}|{marker["total"]}'
+        return f'W/"{hashlib.sha1(key.encode()).hexdigest()}"'
+
+    @staticmethod
+    def _etag_matches(request, etag):
+        def opaque(tag):
+            return tag[2:] if tag.startswith('W/') else tag
+
+        etags = parse_etags(request.headers.get('If-None-Match', ''))
+        return '*' in etags or opaque(etag) in [opaque(tag) for tag in etags]
+
     def retrieve(self, request, *args, **kwargs):
         """
         url: /api/v1/orders/{id}
@@ -47,6 +121,77 @@ class OrderViewSet(ModelViewSet):
         serializer = OrderRetrieveSerializer(instance)
         return Response(serializer.data)
 
+    @action(methods=['get'], detail=False)
+    def batch(self, request):
+        """
+        This method returns many orders in one request, in the requested order.
+        Orders are looked up either by "ids" or by "external_ids" (comma separated),
+        an external_id shared by several orders resolves to the earliest one.
+
+        url request:
+            api/v1/orders/batch?ids=1,25
+            api/v1/orders/batch?external_ids=PR-123-321-123,PR-404
+        response:
+            [{
+                "id": 1,
+                "status": "new",
+                "created_at": "2021-01-01T00:00:00",
+                "external_id": "PR-123-321-123",
+                "details": [{
+                    "id": 1,
+                    "product": {"id": 4, "name": "Dropbox"},
+                    "amount": 10,
+                    "price": "12.00"
+                }]
+            },
+            {
+                "id": 25,
+                "error": "not found"
+            }]
+        """
+        if 'ids' in request.query_params:
+            field = 'id'
+            keys = self._split_param(request.query_params.getlist('ids'))
+            try:
+                if not all(re.fullmatch(r'-?[0-9]+', key) for key in keys):
+                    raise ValueError
+                keys = [int(key) for key in keys]
+                if any(not -2 ** 63 <= key < 2 ** 63 for key in keys):
+                    raise ValueError
+            except ValueError:
+                return Response({"error": "ids must be integers"},
+                                status=status.HTTP_400_BAD_REQUEST)
+        elif 'external_ids' in request.query_params:
+            field = 'external_id'
+            keys = self._split_param(request.query_params.getlist('external_ids'))
+        else:
+            return Response({"error": "pass either 'ids' or 'external_ids'"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if not keys:
+            return Response({"error": f"'{field}s' must not be empty"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(keys) > self.batch_max_size:
+            return Response({"error": f"you cannot request more than {self.batch_max_size} orders"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        orders = Order.objects.filter(**{f'{field}__in': keys}) \
+            .prefetch_related('details__product').order_by('-id')
+        found = {getattr(order, field): order for order in orders}
+
+        data = []
+        for key in keys:
+            order = found.get(key)
+            if order is None:
+                data.append({field: key, "error": "not found"})
+            else:
+                data.append(OrderListSerializer(order).data)
+        return Response(data, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def _split_param(values):
+        return [key.strip() for value in values for key in value.split(',') if key.strip()]
+
     def create(self, request, *args, **kwargs):
         """
         payload:
@@ -78,13 +223,14 @@ class OrderViewSet(ModelViewSet):
             ]
         }
         """
-        order = Order.objects.create(external_id=request.data['external_id'])
-        for data in request.data['details']:
-            product = Product.objects.create(name=data['product']['name'])
-            OrderDetail.objects.create(amount=data['amount'],
-                                       price=data['price'],
-                                       product=product,
-                                       order=order)
+        with transaction.atomic():
+            order = Order.objects.create(external_id=request.data['external_id'])
+            for data in request.data['details']:
+                product = Product.objects.create(name=data['product']['name'])
+                OrderDetail.objects.create(amount=data['amount'],
+                                           price=data['price'],
+                                           product=product,
+                                           order=order)
 
         serializer = OrderListSerializer(order)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
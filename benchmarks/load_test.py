@@ -0,0 +1,410 @@
+"""
+Concurrent load test for the orders API.
+
+Starts a local server on a throwaway SQLite database seeded through the
+ORM (or targets --url and seeds through the API), replays a scenario of
+list, retrieve, create, transition and delete calls at fixed rates and
+reports throughput, latency percentiles, error and SQLite lock-timeout
+rates per call. Requests are sent open-loop, so a saturated endpoint
+shows up as growing latency and dropped requests instead of a silently
+lower rate.
+
+usage:
+    python benchmarks/load_test.py benchmarks/scenarios/orders.json
+    python benchmarks/load_test.py benchmarks/scenarios/orders.json --scale 1 2 4 8
+    python benchmarks/load_test.py benchmarks/scenarios/orders.json --url http://127.0.0.1:8000
+
+scenario:
+    {
+        "duration": 10,             # seconds per stage
+        "seed_orders": 100,         # orders created before the first stage
+        "max_in_flight": 256,       # requests over this limit are dropped
+        "timeout": 30,              # seconds before a request counts as failed
+        "calls": [
+            {"op": "list", "rate": 20, "query": "status=new"},
+            {"op": "retrieve", "rate": 50},
+            {"op": "create", "rate": 10},
+            {"op": "transition", "rate": 10},
+            {"op": "delete", "rate": 5}
+        ]
+    }
+    "rate" is requests per second, "name" tells apart calls with the same op.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from urllib.parse import urlsplit
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+OPS = ['list', 'retrieve', 'create', 'transition', 'delete']
+
+SETTINGS_SHIM = """
+from {profile} import *  # noqa: F401,F403
+from {profile} import DATABASES
+
+DATABASES = {{**DATABASES, 'default': {{**DATABASES['default'], 'NAME': {db_name!r}}}}}
+
+LOGGING = {{
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {{'stderr': {{'class': 'logging.StreamHandler'}}}},
+    'loggers': {{
+        'django.request': {{'handlers': ['stderr'], 'level': 'ERROR', 'propagate': False}},
+        'django.server': {{'handlers': [], 'level': 'ERROR', 'propagate': False}},
+    }},
+}}
+"""
+
+SEED_ORDERS = """
+import json, sys
+import django
+django.setup()
+from django.db import transaction
+from api.models import Order, OrderDetail, Product
+
+readable, transitions = [], []
+with transaction.atomic():
+    for index in range(int(sys.argv[1])):
+        status = Order.FAILED if index % 2 else Order.NEW
+        order = Order.objects.create(external_id='LOAD-%d' % index, status=status)
+        product = Product.objects.create(name='load_product_%d' % (index % 50))
+        OrderDetail.objects.create(order=order, product=product, amount=1, price='1.00')
+        readable.append(order.id)
+        if status == Order.FAILED:
+            transitions.append(order.id)
+print(json.dumps([readable, transitions]))
+"""
+
+LOCKED = 'database is locked'
+SERVER_ERROR = 'Internal Server Error: '
+
+
+class LocalServer:
+    """runserver on a fresh SQLite database, with request errors logged to a file"""
+
+    def __init__(self, profile, port, seed_orders):
+        self.profile = profile
+        self.port = port
+        self.url = f'http://127.0.0.1:{port}'
+        self.seed_orders = seed_orders
+
+    def __enter__(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        tmp = Path(self.tmpdir.name)
+        (tmp / 'loadtest_settings.py').write_text(
+            SETTINGS_SHIM.format(profile=self.profile, db_name=str(tmp / 'db.sqlite3'))
+        )
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'loadtest_settings',
+            'PYTHONPATH': os.pathsep.join([str(tmp), str(BASE_DIR)]),
+        }
+        manage = [sys.executable, str(BASE_DIR / 'manage.py')]
+        subprocess.run(manage + ['migrate', '-v0'], cwd=BASE_DIR, env=env, check=True)
+        seeded = subprocess.run(
+            [sys.executable, '-c', SEED_ORDERS, str(self.seed_orders)],
+            cwd=BASE_DIR, env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        self.readable, self.transitions = json.loads(seeded.strip().splitlines()[-1])
+
+        self.log_path = tmp / 'server.log'
+        self.log = open(self.log_path, 'w')
+        self.process = subprocess.Popen(
+            manage + ['runserver', f'127.0.0.1:{self.port}', '--noreload'],
+            cwd=BASE_DIR, env=env, stdout=self.log, stderr=subprocess.STDOUT,
+        )
+        self._wait_until_ready()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait()
+        self.log.close()
+        self.tmpdir.cleanup()
+
+    def _wait_until_ready(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise SystemExit(f'server exited with code {self.process.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise SystemExit('server did not start in time')
+
+    def log_position(self):
+        return self.log_path.stat().st_size
+
+    def locked_paths(self, position):
+        """Paths of requests that failed on a SQLite lock since `position`"""
+        with open(self.log_path) as log:
+            log.seek(position)
+            text = log.read()
+        locked = Counter()
+        for record in text.split(SERVER_ERROR)[1:]:
+            path, _, traceback = record.partition('\n')
+            if LOCKED in traceback:
+                locked[path.strip()] += 1
+        return locked
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def request(host, port, method, path, body=None):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        payload = json.dumps(body).encode() if body is not None else b''
+        head = (f'{method} {path} HTTP/1.1\r\n'
+                f'Host: {host}:{port}\r\n'
+                'Accept: application/json\r\n'
+                'Content-Type: application/json\r\n'
+                f'Content-Length: {len(payload)}\r\n'
+                'Connection: close\r\n\r\n')
+        writer.write(head.encode() + payload)
+        await writer.drain()
+        raw = await reader.read()
+    finally:
+        writer.close()
+    head, _, content = raw.partition(b'\r\n\r\n')
+    status_line = re.match(rb'HTTP/\d\.\d (\d{3})\b', head)
+    if status_line is None:
+        raise ValueError(f'malformed status line {head[:40]!r}')
+    return int(status_line.group(1)), content
+
+
+def order_payload(index):
+    return {
+        'external_id': f'LOAD-{index}',
+        'details': [{'product': {'name': f'load_product_{index % 50}'}, 'amount': 1, 'price': '1.00'}],
+    }
+
+
+class Workload:
+    """Builds a request for every op from the orders known to exist"""
+
+    def __init__(self, readable, transitions):
+        self.readable = readable
+        self.transition_ids = list(transitions)
+        self.transitions = dict.fromkeys(transitions, 'failed')
+        self.deletable = []
+        self.counter = itertools.count(len(readable))
+
+    def list(self, call):
+        query = call.get('query')
+        return 'GET', '/api/v1/orders' + (f'?{query}' if query else ''), None, None
+
+    def retrieve(self, call):
+        return 'GET', f'/api/v1/orders/{random.choice(self.readable)}', None, None
+
+    def create(self, call):
+        def created(status, content):
+            if status == 201:
+                self.deletable.append(json.loads(content)['id'])
+        return 'POST', '/api/v1/orders', order_payload(next(self.counter)), created
+
+    def transition(self, call):
+        if not self.transition_ids:
+            return None
+        pk = random.choice(self.transition_ids)
+        action = 'accept' if self.transitions[pk] == 'failed' else 'fail'
+        self.transitions[pk] = 'accepted' if action == 'accept' else 'failed'
+        return 'POST', f'/api/v1/orders/{pk}/{action}', None, None
+
+    def delete(self, call):
+        if not self.deletable:
+            return None
+        pk = self.deletable.pop(random.randrange(len(self.deletable)))
+        return 'DELETE', f'/api/v1/orders/{pk}', None, None
+
+
+class CallStats:
+    def __init__(self):
+        self.sent = 0
+        self.skipped = 0
+        self.dropped = 0
+        self.errors = 0
+        self.locks = 0
+        self.latencies = []
+        self.error_paths = []
+
+
+async def seed(host, port, count):
+    """
+    Create `count` orders through the API of an already running server,
+    every other one moved to 'failed' for transitions. A local server is
+    seeded through the ORM before it starts instead.
+    """
+    readable, transitions = [], []
+    for index in range(count):
+        status, content = await request(host, port, 'POST', '/api/v1/orders', order_payload(index))
+        if status != 201:
+            raise SystemExit(f'seeding failed with status {status}: {content[:200]!r}')
+        order = json.loads(content)
+        readable.append(order['id'])
+        if index % 2:
+            body = {'external_id': order['external_id'], 'status': 'failed'}
+            status, content = await request(host, port, 'PUT', f'/api/v1/orders/{order["id"]}', body)
+            if status != 200 or json.loads(content).get('status') != 'failed':
+                raise SystemExit(f'cannot move seeded orders to failed through the API '
+                                 f'(status {status}), load test a local server instead')
+            transitions.append(order['id'])
+    return readable, transitions
+
+
+async def run_stage(host, port, scenario, workload, scale):
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(scenario.get('max_in_flight', 256))
+    timeout = scenario.get('timeout', 30)
+    stats = {call['name']: CallStats() for call in scenario['calls']}
+    tasks = set()
+
+    async def fire(call, stat):
+        built = getattr(workload, call['op'])(call)
+        if built is None:
+            stat.skipped += 1
+            return
+        if semaphore.locked():
+            stat.dropped += 1
+            return
+        method, path, body, callback = built
+        stat.sent += 1
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                status, content = await asyncio.wait_for(
+                    request(host, port, method, path, body), timeout)
+            except (OSError, ValueError, asyncio.TimeoutError):
+                status, content = None, b''
+            stat.latencies.append(time.perf_counter() - start)
+        if status is None or status >= 400:
+            stat.errors += 1
+            stat.error_paths.append(path)
+        elif callback is not None:
+            callback(status, content)
+
+    async def drive(call, stat, deadline):
+        interval = 1 / (call['rate'] * scale)
+        next_at = loop.time()
+        while next_at < deadline:
+            task = asyncio.create_task(fire(call, stat))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            next_at += interval
+            await asyncio.sleep(max(0, next_at - loop.time()))
+
+    started = loop.time()
+    deadline = started + scenario['duration']
+    await asyncio.gather(*(drive(call, stats[call['name']], deadline) for call in scenario['calls']))
+    await asyncio.gather(*tasks)
+    return stats, loop.time() - started
+
+
+def attribute_locks(stats, locked):
+    for stat in stats.values():
+        for path in stat.error_paths:
+            path = urlsplit(path).path
+            if locked[path]:
+                locked[path] -= 1
+                stat.locks += 1
+
+
+def report(scenario, stats, elapsed, scale, with_locks):
+    print(f'\nstage x{scale:g}: {elapsed:.1f}s')
+    print(f'{"call":<18}{"target/s":>9}{"sent":>7}{"done/s":>8}{"p50 ms":>9}{"p90 ms":>9}'
+          f'{"p99 ms":>9}{"max ms":>9}{"err %":>7}{"lock %":>8}{"dropped":>9}{"skipped":>9}')
+    for call in scenario['calls']:
+        stat = stats[call['name']]
+        done = len(stat.latencies)
+        if done:
+            p50, p90, p99 = (percentile(stat.latencies, q) * 1000 for q in (0.50, 0.90, 0.99))
+            worst = max(stat.latencies) * 1000
+            errors = stat.errors / done * 100
+            locks = f'{stat.locks / done * 100:.1f}' if with_locks else 'n/a'
+        else:
+            p50 = p90 = p99 = worst = errors = 0
+            locks = '-'
+        ok = done - stat.errors
+        print(f'{call["name"]:<18}{call["rate"] * scale:>9g}{stat.sent:>7}{ok / elapsed:>8.1f}'
+              f'{p50:>9.1f}{p90:>9.1f}{p99:>9.1f}{worst:>9.1f}{errors:>7.1f}{locks:>8}'
+              f'{stat.dropped:>9}{stat.skipped:>9}')
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def load_scenario(path):
+    with open(path) as scenario_file:
+        scenario = json.load(scenario_file)
+    scenario.setdefault('duration', 10)
+    names = set()
+    for call in scenario.get('calls', []):
+        if call.get('op') not in OPS:
+            raise SystemExit(f'unknown op {call.get("op")!r}, expected one of {", ".join(OPS)}')
+        if not call.get('rate', 0) > 0:
+            raise SystemExit(f'call {call["op"]!r} needs a positive rate')
+        call.setdefault('name', call['op'])
+        if call['name'] in names:
+            raise SystemExit(f'duplicate call name {call["name"]!r}, set "name" to tell them apart')
+        names.add(call['name'])
+    if not names:
+        raise SystemExit('scenario has no calls')
+    return scenario
+
+
+async def run(scenario, scales, host, port, server=None):
+    if server:
+        readable, transitions = server.readable, server.transitions
+    else:
+        readable, transitions = await seed(host, port, scenario.get('seed_orders', 100))
+    workload = Workload(readable, transitions)
+    for scale in scales:
+        position = server.log_position() if server else None
+        stats, elapsed = await run_stage(host, port, scenario, workload, scale)
+        if server:
+            attribute_locks(stats, server.locked_paths(position))
+        report(scenario, stats, elapsed, scale, with_locks=server is not None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('scenario', help='path to a scenario json file')
+    parser.add_argument('--scale', type=float, nargs='+', default=[1],
+                        help='run one stage per factor, multiplying every call rate')
+    parser.add_argument('--settings', default='flow.settings',
+                        help='settings module of the local server')
+    parser.add_argument('--url', help='target an already running server instead; '
+                                      'lock timeouts are not reported then')
+    args = parser.parse_args()
+
+    scenario = load_scenario(args.scenario)
+    if args.url:
+        target = urlsplit(args.url)
+        asyncio.run(run(scenario, args.scale, target.hostname, target.port or 80))
+        return
+    with LocalServer(args.settings, free_port(), scenario.get('seed_orders', 100)) as server:
+        asyncio.run(run(scenario, args.scale, '127.0.0.1', server.port, server))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Compare cold-start and per-request overhead of two settings profiles.
+
+Every measurement runs in a fresh interpreter, because Django settings can
+only be configured once per process. DEBUG is forced to the same value in
+every profile (--debug, off by default), so its query logging does not skew
+the comparison.
+
+Requests go through the test client against an in-memory test database, so
+the cost of opening database connections, and savings from reusing them
+via CONN_MAX_AGE, are not covered.
+
+usage:
+    python benchmarks/startup_overhead.py
+    python benchmarks/startup_overhead.py --runs 10 --requests 2000 \
+        --profile flow.settings --profile flow.settings_api
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_PROFILES = ['flow.settings', 'flow.settings_api']
+
+COLD_START = """
+import time
+start = time.perf_counter()
+from flow.wsgi import application
+print(time.perf_counter() - start)
+"""
+
+PER_REQUEST = """
+import json, sys, time
+from flow.wsgi import application
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment
+
+setup_test_environment(debug=sys.argv[2] == 'on')
+connection.creation.create_test_db(verbosity=0)
+
+from api.models import Order, OrderDetail, Product
+
+order = Order.objects.create(external_id='bench')
+product = Product.objects.create(name='bench')
+OrderDetail.objects.create(order=order, product=product, amount=1, price='1.00')
+
+client = Client(HTTP_ACCEPT='application/json')
+url = '/api/v1/orders/%d' % order.pk
+requests = int(sys.argv[1])
+for _ in range(min(requests, 50)):
+    client.get(url)
+
+timings = []
+for _ in range(requests):
+    start = time.perf_counter()
+    response = client.get(url)
+    timings.append(time.perf_counter() - start)
+    assert response.status_code == 200, response.status_code
+print(json.dumps(timings))
+"""
+
+
+def run(profile, script, *args):
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': profile, 'PYTHONDONTWRITEBYTECODE': '1'}
+    output = subprocess.run(
+        [sys.executable, '-c', script, *args],
+        cwd=BASE_DIR, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return output.strip().splitlines()[-1]
+
+
+def cold_start(profile, runs):
+    return [float(run(profile, COLD_START)) for _ in range(runs)]
+
+
+def per_request(profile, requests, debug):
+    return json.loads(run(profile, PER_REQUEST, str(requests), 'on' if debug else 'off'))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5,
+                        help='fresh interpreters used to time cold start')
+    parser.add_argument('--requests', type=int, default=1000,
+                        help='GET /api/v1/orders/<id> calls timed per profile')
+    parser.add_argument('--profile', action='append', dest='profiles',
+                        help='settings module to compare (repeatable)')
+    parser.add_argument('--debug', action='store_true',
+                        help='time requests with DEBUG on in every profile')
+    args = parser.parse_args()
+
+    profiles = args.profiles or DEFAULT_PROFILES
+    baseline = None
+    debug = 'on' if args.debug else 'off'
+    print(f'{"profile":<22}{"debug":>7}{"cold start ms":>15}{"req p50 us":>13}{"req p95 us":>13}{"vs first":>10}')
+    for profile in profiles:
+        startup = statistics.median(cold_start(profile, args.runs)) * 1000
+        timings = per_request(profile, args.requests, args.debug)
+        p50 = percentile(timings, 0.50) * 1e6
+        p95 = percentile(timings, 0.95) * 1e6
+        if baseline is None:
+            baseline = p50
+        print(f'{profile:<22}{debug:>7}{startup:>15.1f}{p50:>13.0f}{p95:>13.0f}{p50 / baseline:>9.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Lean settings profile for running flow as a JSON-only API.
+
+The API is unauthenticated and never renders HTML, so this profile drops
+admin, sessions, messages, CSRF, templates and the browsable API on top of
+the default settings. Select it with:
+
+    DJANGO_SETTINGS_MODULE=flow.settings_api
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, REST_FRAMEWORK
+
+DEBUG = False
+
+ALLOWED_HOSTS = ['0.0.0.0', '127.0.0.1', 'localhost']
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'rest_framework',
+    'django_filters',
+    'api',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+ROOT_URLCONF = 'flow.urls_api'
+
+TEMPLATES = []
+
+AUTH_PASSWORD_VALIDATORS = []
+
+
+# Database
+# Keep connections open between requests instead of reconnecting each time.
+
+DATABASES = {
+    alias: {**config, 'CONN_MAX_AGE': 600}
+    for alias, config in DATABASES.items()
+}
+
+
+# Django RestFramework
+# JSON in, JSON out; no authentication so django.contrib.auth is not needed.
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+    'DEFAULT_PARSER_CLASSES': ['rest_framework.parsers.JSONParser'],
+    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.AllowAny'],
+    'UNAUTHENTICATED_USER': None,
+    'TEST_REQUEST_DEFAULT_FORMAT': 'json',
+}